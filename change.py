@@ -1,99 +1,316 @@
 import os
 import sys
 import json
-import boto3
+import time
+import socket
+import logging
+import threading
+import collections
 
-from distutils import util
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+ENV_HOSTED_ZONE_ID = "INPUT_AWS_ROUTE53_HOSTED_ZONE_ID"
+ENV_RR_ACTION = "INPUT_AWS_ROUTE53_RR_ACTION"
+ENV_RR_NAME = "INPUT_AWS_ROUTE53_RR_NAME"
+ENV_RR_TYPE = "INPUT_AWS_ROUTE53_RR_TYPE"
+ENV_RR_TTL = "INPUT_AWS_ROUTE53_RR_TTL"
+ENV_RR_VALUE = "INPUT_AWS_ROUTE53_RR_VALUE"
+ENV_RR_COMMENT = "INPUT_AWS_ROUTE53_RR_COMMENT"
+ENV_RR_CHANGES_JSON = "INPUT_AWS_ROUTE53_RR_CHANGES_JSON"
+ENV_WAIT = "INPUT_AWS_ROUTE53_WAIT"
+ENV_RUNNER_DEBUG = "RUNNER_DEBUG"
+ENV_ENDPOINT_OVERRIDES = ("AWS_ENDPOINT_URL", "AWS_ENDPOINT_URL_ROUTE_53")
+
+SUPPORTED_ACTIONS = frozenset({
+    "CREATE", "DELETE", "UPSERT"
+})
+SUPPORTED_RECORD_TYPES = frozenset({
+    "SOA", "A", "TXT", "NS", "CNAME", "MX", "PTR", "SRV", "SPF", "AAAA"
+})
+DEFAULT_TTL = 300
+MAX_TTL = 2147483647
+
+_BAD_ACTION_MSG = (
+    "Unsupported record set action: %s (expected one of "
+    + ", ".join(sorted(SUPPORTED_ACTIONS)) + ")"
+)
+_BAD_TYPE_MSG = (
+    "Unsupported record set type: %s (expected one of "
+    + ", ".join(sorted(SUPPORTED_RECORD_TYPES)) + ")"
+)
+_BAD_TTL_MSG = "Invalid record set TTL: %s (expected 0 to " + str(MAX_TTL) + ")"
+
+_TRUTHY = frozenset({"true", "1", "yes", "on", "y", "t"})
+_FALSY = frozenset({"false", "0", "no", "off", "n", "f", ""})
+
+ROUTE53_ENDPOINT = "route53.amazonaws.com"
+CONNECT_TIMEOUT = 3
+READ_TIMEOUT = 15
+
+WAIT_TIMEOUT = 500
+WAIT_MAX_DELAY = 15
+
+logger = logging.getLogger(__name__)
+
+RecordChange = collections.namedtuple(
+    "RecordChange", ["action", "name", "type", "ttl", "values"]
+)
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def _resolve_endpoint():
+    """
+    Resolves the Route 53 endpoint so the first request hits a warm resolver cache.
+    Only the default aws partition endpoint is resolved, and the benefit relies on
+    an upstream cache since musl keeps none in process.
+    Failures are ignored, the request itself will surface them.
+    """
+    try:
+        socket.getaddrinfo(ROUTE53_ENDPOINT, 443, socket.AF_UNSPEC, socket.SOCK_STREAM)
+    except OSError:
+        pass
 
 
 class AWSRoute53RecordSet:
     """
     Primary class for the handling of AWS Route 53 Record Sets.
     """
-    def __init__(self):
+    def __init__(self, env=None, wait_timeout=WAIT_TIMEOUT):
         """
         The default constructor.
+        The environment is snapshotted once unless a mapping is passed in.
         """
+        self._env = dict(os.environ) if env is None else env
         self.client = None
-        self.waiter = None
-        self.rr_skeleton = dict()
+        self.wait_timeout = wait_timeout
 
     def _get_env(self, variable, exit=True):
         """
-        Try to fetch a variable from the environment.
+        Try to fetch a variable from the environment snapshot.
         Per default the method will raise an exception if the variable isn't present.
         This behaviour can be switched off via the exit flag.
         """
-        value = os.environ.get(variable)
+        value = self._env.get(variable)
         if not value and exit:
             raise NameError("Cannot find environment variable: " + str(variable))
         return value
 
+    def _validate_action(self, action):
+        """
+        Ensures the given action is supported by Route 53.
+        """
+        if action not in SUPPORTED_ACTIONS:
+            raise ValueError(_BAD_ACTION_MSG % action)
+        return action
+
+    def _validate_record_type(self, record_type):
+        """
+        Ensures the given record type is supported by this Action.
+        """
+        if record_type not in SUPPORTED_RECORD_TYPES:
+            raise ValueError(_BAD_TYPE_MSG % record_type)
+        return record_type
+
+    def _validate_ttl(self, ttl):
+        """
+        Converts the given TTL to an integer, falling back to DEFAULT_TTL if unset.
+        Integers (e.g. from the changes JSON) are range checked without conversion.
+        Like int(), strings may carry surrounding whitespace and a leading "+".
+        """
+        if ttl is None or ttl == "":
+            return DEFAULT_TTL
+        if type(ttl) is int:
+            value = ttl
+        elif isinstance(ttl, str):
+            digits = ttl.strip()
+            if digits[:1] == "+":
+                digits = digits[1:]
+            if not digits.isdecimal():
+                raise ValueError(_BAD_TTL_MSG % (ttl,))
+            value = int(digits)
+        else:
+            raise ValueError(_BAD_TTL_MSG % (ttl,))
+        if value < 0 or value > MAX_TTL:
+            raise ValueError(_BAD_TTL_MSG % (ttl,))
+        return value
+
     def _connect(self):
         """
         Creates a new client object which wraps the connection to AWS.
+        The client is cached at module scope so warm invocations reuse it.
+        boto3 is only imported here to keep it off the validation path.
+        The endpoint is resolved in the background while boto3 is imported,
+        unless an endpoint override is configured.
         """
-        if not self.client:
-            boto3.set_stream_logger('botocore', level='DEBUG')
-            self.client = boto3.client(
-                "route53"
-            )
-            self.waiter = self.client.get_waiter("resource_record_sets_changed")
+        global _CLIENT
+        if self.client:
+            return
+        with _CLIENT_LOCK:
+            if not _CLIENT:
+                if not any(self._env.get(name) for name in ENV_ENDPOINT_OVERRIDES):
+                    threading.Thread(target=_resolve_endpoint, daemon=True).start()
+                import boto3
+                from botocore.config import Config
 
-    def _set_comment(self):
+                if self._env.get(ENV_RUNNER_DEBUG) == "1":
+                    logging.getLogger("botocore").setLevel(logging.DEBUG)
+                session = boto3.session.Session()
+                _CLIENT = session.client(
+                    "route53",
+                    config=Config(
+                        tcp_keepalive=True,
+                        max_pool_connections=10,
+                        connect_timeout=CONNECT_TIMEOUT,
+                        read_timeout=READ_TIMEOUT,
+                        retries={
+                            "mode": "adaptive",
+                            "max_attempts": 5
+                        }
+                    )
+                )
+        self.client = _CLIENT
+
+    def _read_record_inputs(self):
         """
-        Appends an additional comment field to the record set.
+        Remaps the individual record set inputs onto the keys of a changes JSON entry.
         """
-        comment = self._get_env("INPUT_AWS_ROUTE53_RR_COMMENT", False)
-        if comment:
-            self.rr_skeleton["Comment"] = comment
+        return {
+            "action": self._get_env(ENV_RR_ACTION),
+            "name": self._get_env(ENV_RR_NAME),
+            "type": self._get_env(ENV_RR_TYPE),
+            "ttl": self._get_env(ENV_RR_TTL, exit=False),
+            "value": self._get_env(ENV_RR_VALUE)
+        }
 
-    def _set_base_changes(self):
+    def _parse_record_change(self, entry, source):
+        """
+        Validates a single {action, name, type, ttl, value} mapping into a RecordChange.
+        The value may either be a single string or a list of strings.
         """
-        Creates the base skeleton required for creating a new record set.
+        if not isinstance(entry, dict):
+            raise ValueError("Invalid record set in " + source + ": expected an object")
+        try:
+            action = entry["action"]
+            name = entry["name"]
+            record_type = entry["type"]
+            values = entry["value"]
+        except KeyError as e:
+            raise ValueError("Invalid record set in " + source + ": missing " + str(e))
+        if not isinstance(values, list):
+            values = [values]
+        if not isinstance(action, str) or not isinstance(record_type, str):
+            raise ValueError("Invalid record set in " + source + ": action and type must be strings")
+        if not isinstance(name, str) or not values or not all(isinstance(v, str) for v in values):
+            raise ValueError("Invalid record set in " + source + ": name and value must be strings")
+        return RecordChange(
+            self._validate_action(action),
+            name,
+            self._validate_record_type(record_type),
+            self._validate_ttl(entry.get("ttl")),
+            values
+        )
+
+    def _parse_changes(self, changes_json):
+        """
+        Parses a JSON array of record set mappings into RecordChanges.
+        """
+        entries = orjson.loads(changes_json) if orjson else json.loads(changes_json)
+        if not isinstance(entries, list) or not entries:
+            raise ValueError("Expected a non-empty JSON array in " + ENV_RR_CHANGES_JSON)
+        parse_record_change = self._parse_record_change
+        return [
+            parse_record_change(entry, ENV_RR_CHANGES_JSON + " entry " + str(index))
+            for index, entry in enumerate(entries)
+        ]
+
+    def _build_change(self, change):
         """
-        self.rr_skeleton["Changes"] = [{
-            "Action": self._get_env("INPUT_AWS_ROUTE53_RR_ACTION"),
+        Builds a single entry of the change batch from a validated RecordChange.
+        """
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "Built record set: %s %s %s -> %s (TTL: %d)",
+                change.action, change.type, change.name, ", ".join(change.values), change.ttl
+            )
+        return {
+            "Action": change.action,
             "ResourceRecordSet": {
-                "Name": self._get_env("INPUT_AWS_ROUTE53_RR_NAME"),
-                "Type": self._get_env("INPUT_AWS_ROUTE53_RR_TYPE"),
-                "TTL": int(self._get_env("INPUT_AWS_ROUTE53_RR_TTL", exit=False)) or 300,
-                "ResourceRecords": [{
-                    "Value": self._get_env("INPUT_AWS_ROUTE53_RR_VALUE")
-                }]
+                "Name": change.name,
+                "Type": change.type,
+                "TTL": change.ttl,
+                "ResourceRecords": [{"Value": value} for value in change.values]
             }
-        }]
+        }
 
-    def _build_record_set(self):
+    def _build_change_batch(self):
         """
-        Builds up the skeleton used for modulating the record set.
+        Builds the change batch used for modulating the record set.
+        Multiple changes are read from the changes JSON input if given,
+        otherwise a single change is built from the individual inputs.
+        The comment is only included if one was given.
         """
-        self._set_comment()
-        self._set_base_changes()
-        return self.rr_skeleton
+        comment = self._get_env(ENV_RR_COMMENT, False)
+        changes_json = self._get_env(ENV_RR_CHANGES_JSON, False)
+        if changes_json:
+            record_changes = self._parse_changes(changes_json)
+        else:
+            record_changes = [
+                self._parse_record_change(self._read_record_inputs(), "inputs")
+            ]
+        return {
+            **({"Comment": comment} if comment else {}),
+            "Changes": [self._build_change(change) for change in record_changes]
+        }
 
-    def _change_record_set(self, record_set):
+    def _change_record_set(self, hosted_zone_id, record_set):
         """
         Requests the required change at AWS.
         """
         return self.client.change_resource_record_sets(
-            HostedZoneId=self._get_env("INPUT_AWS_ROUTE53_HOSTED_ZONE_ID"),
+            HostedZoneId=hosted_zone_id,
             ChangeBatch=record_set
         )
 
-    def _wait(self, request_id):
+    def _should_wait(self):
+        """
+        Resolves the wait input to a bool, raising on anything not clearly true or false.
+        """
+        wait = (self._get_env(ENV_WAIT, False) or "").lower()
+        if wait in _TRUTHY:
+            return True
+        if wait in _FALSY:
+            return False
+        raise ValueError("Invalid value for " + ENV_WAIT + ": " + wait)
+
+    def _wait(self, request_id, should_wait, initial_status=None):
         """
         Waits until the requested operations is finished.
+        Polls with an exponential backoff capped at WAIT_MAX_DELAY seconds.
+        Raises TimeoutError after wait_timeout seconds.
+        Nothing is polled if the change was already reported as in sync.
         """
-        wait = self._get_env("INPUT_AWS_ROUTE53_WAIT", False)
-        if wait and util.strtobool(wait):
-            self.waiter.wait(
-                Id=request_id,
-                WaiterConfig={
-                    "Delay": 10,
-                    "MaxAttempts": 50
-                }
-            )
+        if not should_wait or initial_status == "INSYNC":
+            return
+        deadline = time.monotonic() + self.wait_timeout
+        attempt = 0
+        while True:
+            result = self.client.get_change(Id=request_id)
+            if result["ChangeInfo"]["Status"] == "INSYNC":
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(
+                    "Change " + str(request_id) + " not in sync after "
+                    + str(self.wait_timeout) + " seconds"
+                )
+            time.sleep(min(1.5 ** attempt, WAIT_MAX_DELAY, remaining))
+            attempt += 1
 
     def _obtain_request_id(self, result):
         """
@@ -101,30 +318,70 @@ class AWSRoute53RecordSet:
         """
         return result["ChangeInfo"]["Id"]
 
+    def _obtain_status(self, result):
+        """
+        Grabs and returns the status of the given request.
+        """
+        return result["ChangeInfo"]["Status"]
+
     def _obtain_marshalled_result(self, result):
         """
-        Grabs and returns the HTTP response of the given request.
+        Grabs and returns the HTTP response of the given request as compact JSON bytes.
+        Uses orjson if available, the stdlib output is byte-for-byte the same.
         """
-        return json.dumps(result["ResponseMetadata"], indent=4)
+        if orjson:
+            return orjson.dumps(result["ResponseMetadata"])
+        return json.dumps(
+            result["ResponseMetadata"], separators=(",", ":"), ensure_ascii=False
+        ).encode()
 
     def change(self):
         """
         Entrypoint for the management of a record set.
         """
+        hosted_zone_id = self._get_env(ENV_HOSTED_ZONE_ID)
+        record_set = self._build_change_batch()
+        should_wait = self._should_wait()
         self._connect()
-        record_set = self._build_record_set()
-        result = self._change_record_set(record_set)
+        result = self._change_record_set(hosted_zone_id, record_set)
         self._wait(
-            self._obtain_request_id(result)
+            self._obtain_request_id(result),
+            should_wait,
+            initial_status=self._obtain_status(result)
         )
-        sys.stdout.write(
-            self._obtain_marshalled_result(result) + "\n"
+        sys.stdout.buffer.write(
+            self._obtain_marshalled_result(result) + b"\n"
         )
+        sys.stdout.flush()
 
 
-try:
-    o = AWSRoute53RecordSet()
-    o.change()
-except Exception as e:
-    sys.stderr.write(str(e) + "\n")
-    sys.exit(1)
+def _setup_logging():
+    """
+    Sends log records to stderr without timestamps, the runner adds its own.
+    Only installs a handler once, so repeated calls to main() are safe.
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+
+
+def main():
+    """
+    Runs a single record set change and exits non-zero on failure.
+    Repeated calls within one process reuse the cached client.
+    """
+    _setup_logging()
+    try:
+        o = AWSRoute53RecordSet()
+        o.change()
+    except Exception:
+        logger.exception("Route 53 record set change failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()